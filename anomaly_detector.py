@@ -10,20 +10,36 @@ Uses statistical analysis and pattern matching to detect:
 - Abnormal protocol usage
 """
 
+import ipaddress
+import math
 import sqlite3
-import statistics
 from datetime import datetime, timedelta
 from collections import defaultdict
 
+from db import open_db, ensure_schema
+
 DB_PATH = "netsec_monitor.db"
 
+# Temp table holding the events shared by the short-window detectors
+RECENT_TABLE = "temp.recent_events"
+RECENT_WINDOW = '-10 minutes'  # Widest window of the fused detectors
+
+# Internal network for exfiltration checks, as an integer range
+INTERNAL_NETWORK = ipaddress.ip_network('192.168.0.0/16')
+INTERNAL_LO = int(INTERNAL_NETWORK.network_address)
+INTERNAL_HI = int(INTERNAL_NETWORK.broadcast_address)
+
+# Severity ladder indexed by the number of thresholds a detection exceeds
+SEVERITY = ('medium', 'high', 'critical')
+
 class AnomalyDetector:
     """
     Statistical anomaly detection for network security
     """
     
     def __init__(self):
-        self.db_conn = sqlite3.connect(DB_PATH)
+        self.db_conn = open_db(DB_PATH)
+        ensure_schema(self.db_conn)
         self.baselines = {}
         self.load_baselines()
     
@@ -48,86 +64,121 @@ class AnomalyDetector:
     def establish_baseline(self, profile_name, metric_name, lookback_hours=24):
         """
         Establish baseline for a metric based on historical data
-        Uses mean and standard deviation
+        Uses mean and standard deviation, maintained incrementally so each
+        run only folds in minutes not yet seen
         """
         cursor = self.db_conn.cursor()
         
         # Example: Traffic volume baseline
         if metric_name == 'packets_per_minute':
+            # Resume from the stored accumulator, or start a fresh lookback
             cursor.execute("""
-                SELECT COUNT(*) as packet_count
-                FROM traffic_events
-                WHERE timestamp > datetime('now', ?)
-                GROUP BY strftime('%Y-%m-%d %H:%M', timestamp)
-            """, (f'-{lookback_hours} hours',))
+                SELECT sample_count, baseline_value, sum_sq_diff, last_updated
+                FROM baseline_profiles
+                WHERE profile_name = ? AND metric_name = ?
+            """, (profile_name, metric_name))
+            
+            row = cursor.fetchone()
+            if row and row[0]:
+                n, mean, m2, since = row
+            else:
+                n, mean, m2, since = 0, 0.0, 0.0, None
+            
+            # Only complete minutes are folded in; the current one is still filling.
+            # Rollup minutes are keyed by the monitor's local-time timestamps,
+            # so the bounds use the same clock
+            cursor.execute("""
+                SELECT strftime('%Y-%m-%d %H:%M', 'now', 'localtime'),
+                       COALESCE(substr(?, 1, 16),
+                                strftime('%Y-%m-%d %H:%M', 'now', 'localtime', ?))
+            """, (since, f'-{lookback_hours} hours'))
+            
+            until, since = cursor.fetchone()
             
-            values = [row[0] for row in cursor.fetchall()]
+            # Summarize the new minutes in SQL: count, mean and sum of squares
+            cursor.execute("""
+                SELECT COUNT(*), AVG(packet_count), SUM(packet_count * packet_count)
+                FROM (
+                    SELECT SUM(packets) as packet_count
+                    FROM traffic_minute_rollup
+                    WHERE minute_ts >= ? AND minute_ts < ?
+                    GROUP BY minute_ts
+                )
+            """, (since, until))
             
-            if len(values) > 10:  # Need sufficient data
-                mean = statistics.mean(values)
-                std_dev = statistics.stdev(values)
+            batch_n, batch_mean, batch_sq = cursor.fetchone()
+            
+            # Merge the batch into the running accumulator (Chan et al.)
+            if batch_n:
+                batch_m2 = batch_sq - batch_n * batch_mean * batch_mean
+                delta = batch_mean - mean
+                total = n + batch_n
+                mean += delta * batch_n / total
+                m2 += batch_m2 + delta * delta * n * batch_n / total
+                n = total
+            
+            if n > 10:  # Need sufficient data
+                std_dev = math.sqrt(m2 / (n - 1))
                 
                 # Set thresholds at 3 standard deviations
                 threshold_high = mean + (3 * std_dev)
                 threshold_low = max(0, mean - (3 * std_dev))
                 
-                # Save to database
-                cursor.execute("""
-                    INSERT OR REPLACE INTO baseline_profiles
-                    (profile_name, metric_name, baseline_value, std_deviation,
-                     threshold_high, threshold_low)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (profile_name, metric_name, mean, std_dev, 
-                      threshold_high, threshold_low))
-                
-                self.db_conn.commit()
+                # Save baseline and accumulator state together in one transaction
+                with self.db_conn:
+                    cursor.execute("""
+                        INSERT OR REPLACE INTO baseline_profiles
+                        (profile_name, metric_name, baseline_value, std_deviation,
+                         threshold_high, threshold_low, sample_count, sum_sq_diff,
+                         last_updated)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (profile_name, metric_name, mean, std_dev, 
+                          threshold_high, threshold_low, n, m2, until))
                 
                 print(f"✅ Baseline established for {metric_name}")
-                print(f"   Mean: {mean:.2f}, Std Dev: {std_dev:.2f}")
+                print(f"   Mean: {mean:.2f}, Std Dev: {std_dev:.2f} ({n} samples)")
                 print(f"   Alert thresholds: {threshold_low:.2f} - {threshold_high:.2f}")
                 
                 return True
         
         return False
     
-    def detect_port_scan(self, lookback_minutes=5):
+    def detect_port_scan(self, lookback_minutes=5, table='traffic_events'):
         """
         Detect potential port scanning activity
         Criteria: Single source IP contacting many different ports
         """
         cursor = self.db_conn.cursor()
         
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT 
                 source_ip,
                 COUNT(DISTINCT destination_port) as unique_ports,
-                COUNT(*) as total_attempts,
-                GROUP_CONCAT(DISTINCT destination_port) as ports
-            FROM traffic_events
+                COUNT(*) as total_attempts
+            FROM {table}
             WHERE timestamp > datetime('now', ?)
             GROUP BY source_ip
             HAVING unique_ports > 20
         """, (f'-{lookback_minutes} minutes',))
         
-        alerts_created = 0
+        alerts = []
         for row in cursor.fetchall():
             source_ip = row[0]
             unique_ports = row[1]
             total_attempts = row[2]
             
-            # Create alert
-            self.create_alert(
+            alerts.append(dict(
                 alert_type='port_scan',
-                severity='high' if unique_ports > 50 else 'medium',
+                severity=SEVERITY[(unique_ports > 50) + (unique_ports > 200)],
                 source_ip=source_ip,
                 description=f"Potential port scan detected from {source_ip}",
                 details=f"Contacted {unique_ports} unique ports with {total_attempts} attempts in {lookback_minutes} minutes"
-            )
-            alerts_created += 1
+            ))
         
-        return alerts_created
+        self.create_alerts(alerts)
+        return len(alerts)
     
-    def detect_traffic_spike(self):
+    def detect_traffic_spike(self, table='traffic_events'):
         """
         Detect unusual traffic volume spikes
         Compares current traffic to baseline
@@ -135,9 +186,9 @@ class AnomalyDetector:
         cursor = self.db_conn.cursor()
         
         # Get current minute's traffic
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT COUNT(*) as packet_count
-            FROM traffic_events
+            FROM {table}
             WHERE timestamp > datetime('now', '-1 minute')
         """)
         
@@ -170,36 +221,39 @@ class AnomalyDetector:
         cursor = self.db_conn.cursor()
         
         # Get protocol distribution for last hour
+        # The window SUM reuses the grouped counts as the denominator
         cursor.execute("""
-            SELECT 
-                protocol,
-                COUNT(*) as count,
-                COUNT(*) * 100.0 / (SELECT COUNT(*) FROM traffic_events 
-                                     WHERE timestamp > datetime('now', '-1 hour')) as percentage
-            FROM traffic_events
-            WHERE timestamp > datetime('now', '-1 hour')
-            GROUP BY protocol
-            HAVING percentage > 30 AND protocol NOT IN ('TCP', 'UDP', 'HTTP', 'HTTPS')
+            SELECT protocol, count, percentage
+            FROM (
+                SELECT 
+                    protocol,
+                    COUNT(*) as count,
+                    COUNT(*) * 100.0 / SUM(COUNT(*)) OVER () as percentage
+                FROM traffic_events
+                WHERE timestamp > datetime('now', '-1 hour')
+                GROUP BY protocol
+            )
+            WHERE percentage > 30 AND protocol NOT IN ('TCP', 'UDP', 'HTTP', 'HTTPS')
         """)
         
-        alerts_created = 0
+        alerts = []
         for row in cursor.fetchall():
             protocol = row[0]
             count = row[1]
             percentage = row[2]
             
-            self.create_alert(
+            alerts.append(dict(
                 alert_type='unusual_protocol',
                 severity='medium',
                 source_ip=None,
                 description=f"Unusual protocol usage: {protocol}",
                 details=f"{protocol} comprises {percentage:.1f}% of traffic ({count} packets)"
-            )
-            alerts_created += 1
+            ))
         
-        return alerts_created
+        self.create_alerts(alerts)
+        return len(alerts)
     
-    def detect_failed_connections(self):
+    def detect_failed_connections(self, table='traffic_events'):
         """
         Detect high rate of failed connections
         May indicate brute force attempts or scanning
@@ -207,59 +261,60 @@ class AnomalyDetector:
         cursor = self.db_conn.cursor()
         
         # Look for IPs with many SYN packets but few established connections
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT 
                 source_ip,
                 destination_ip,
                 destination_port,
                 COUNT(*) as syn_count
-            FROM traffic_events
-            WHERE timestamp > datetime('now', '-5 minutes')
-            AND flags LIKE '%SYN%'
+            FROM {table}
+            WHERE is_syn = 1
+            AND timestamp > datetime('now', '-5 minutes')
             GROUP BY source_ip, destination_ip, destination_port
             HAVING syn_count > 50
         """)
         
-        alerts_created = 0
+        alerts = []
         for row in cursor.fetchall():
             source_ip = row[0]
             dest_ip = row[1]
             dest_port = row[2]
             syn_count = row[3]
             
-            self.create_alert(
+            alerts.append(dict(
                 alert_type='connection_flood',
                 severity='high',
                 source_ip=source_ip,
                 description=f"High connection attempt rate from {source_ip}",
                 details=f"{syn_count} SYN packets to {dest_ip}:{dest_port} in 5 minutes"
-            )
-            alerts_created += 1
+            ))
         
-        return alerts_created
+        self.create_alerts(alerts)
+        return len(alerts)
     
-    def detect_data_exfiltration(self):
+    def detect_data_exfiltration(self, table='traffic_events'):
         """
         Detect potential data exfiltration
         Large outbound data transfers to unusual destinations
         """
         cursor = self.db_conn.cursor()
         
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT 
                 source_ip,
                 destination_ip,
                 SUM(packet_size) as total_bytes,
                 COUNT(*) as packet_count
-            FROM traffic_events
-            WHERE timestamp > datetime('now', '-10 minutes')
-            AND source_ip LIKE '192.168.%'  -- Internal network
-            AND destination_ip NOT LIKE '192.168.%'  -- External destination
+            FROM {table}
+            WHERE source_ip_int BETWEEN :lo AND :hi  -- Internal network
+            AND (destination_ip_int IS NULL
+                 OR destination_ip_int NOT BETWEEN :lo AND :hi)  -- External destination
+            AND timestamp > datetime('now', '-10 minutes')
             GROUP BY source_ip, destination_ip
             HAVING total_bytes > 10485760  -- 10MB
-        """)
+        """, {'lo': INTERNAL_LO, 'hi': INTERNAL_HI})
         
-        alerts_created = 0
+        alerts = []
         for row in cursor.fetchall():
             source_ip = row[0]
             dest_ip = row[1]
@@ -268,51 +323,65 @@ class AnomalyDetector:
             
             mb_transferred = total_bytes / 1048576
             
-            self.create_alert(
+            alerts.append(dict(
                 alert_type='data_exfiltration',
                 severity='high',
                 source_ip=source_ip,
                 description=f"Large data transfer detected",
                 details=f"{source_ip} sent {mb_transferred:.2f}MB to {dest_ip} ({packet_count} packets)"
-            )
-            alerts_created += 1
+            ))
         
-        return alerts_created
+        self.create_alerts(alerts)
+        return len(alerts)
     
     def create_alert(self, alert_type, severity, source_ip, description, details):
-        """Create security alert in database"""
+        """Create security alert in database (committed by the caller)"""
+        return self.create_alerts([dict(
+            alert_type=alert_type,
+            severity=severity,
+            source_ip=source_ip,
+            description=description,
+            details=details
+        )])
+    
+    def create_alerts(self, alerts):
+        """
+        Create a batch of security alerts in database
+        Duplicates of an open alert with the same type and source in the
+        same 10 minute bucket are rejected by idx_alerts_dedup; returns the
+        number actually created. The caller owns the commit so a whole
+        detection cycle is written in one transaction
+        """
+        if not alerts:
+            return 0
+        
         try:
             cursor = self.db_conn.cursor()
             
-            # Check if similar alert exists recently (avoid duplicates)
-            cursor.execute("""
-                SELECT id FROM security_alerts
-                WHERE alert_type = ?
-                AND source_ip = ?
-                AND timestamp > datetime('now', '-10 minutes')
-                AND status = 'open'
-            """, (alert_type, source_ip))
-            
-            if cursor.fetchone():
-                return  # Alert already exists
-            
-            # Create new alert
-            cursor.execute("""
-                INSERT INTO security_alerts
-                (timestamp, alert_type, severity, source_ip, description, details, status)
-                VALUES (datetime('now'), ?, ?, ?, ?, ?, 'open')
-            """, (alert_type, severity, source_ip, description, details))
-            
-            self.db_conn.commit()
+            new_alerts = []
+            for alert in alerts:
+                cursor.execute("""
+                    INSERT OR IGNORE INTO security_alerts
+                    (timestamp, alert_type, severity, source_ip, description, details, status)
+                    VALUES (datetime('now'), :alert_type, :severity, :source_ip,
+                            :description, :details, 'open')
+                """, alert)
+                
+                if cursor.rowcount:
+                    new_alerts.append(alert)
             
             # Print to console
-            print(f"\n🚨 ALERT CREATED [{severity.upper()}]")
-            print(f"   Type: {alert_type}")
-            print(f"   {description}")
-            print(f"   Details: {details}\n")
+            for alert in new_alerts:
+                print(f"\n🚨 ALERT CREATED [{alert['severity'].upper()}]")
+                print(f"   Type: {alert['alert_type']}")
+                print(f"   {alert['description']}")
+                print(f"   Details: {alert['details']}\n")
+            
+            return len(new_alerts)
             
         except sqlite3.Error as e:
             print(f"❌ Failed to create alert: {e}")
+            return 0
     
     def run_all_detections(self):
         """Run all anomaly detection checks"""
@@ -320,34 +389,52 @@ class AnomalyDetector:
         
         total_alerts = 0
         
-        # Port scan detection
-        alerts = self.detect_port_scan()
-        total_alerts += alerts
-        if alerts:
-            print(f"   ✅ Port scan detection: {alerts} alert(s)")
-        
-        # Traffic spike detection
-        if self.detect_traffic_spike():
-            total_alerts += 1
-            print(f"   ✅ Traffic spike detection: 1 alert")
-        
-        # Unusual protocol detection
-        alerts = self.detect_unusual_protocol()
-        total_alerts += alerts
-        if alerts:
-            print(f"   ✅ Unusual protocol detection: {alerts} alert(s)")
-        
-        # Failed connections
-        alerts = self.detect_failed_connections()
-        total_alerts += alerts
-        if alerts:
-            print(f"   ✅ Connection flood detection: {alerts} alert(s)")
+        # Copy the short-window events once so the detectors below
+        # aggregate over a small temp table instead of re-scanning
+        # traffic_events for each check
+        cursor = self.db_conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {RECENT_TABLE}")
+        cursor.execute(f"""
+            CREATE TABLE {RECENT_TABLE} AS
+            SELECT timestamp, source_ip, destination_ip, destination_port,
+                   protocol, packet_size, is_syn, source_ip_int, destination_ip_int
+            FROM traffic_events
+            WHERE timestamp > datetime('now', ?)
+        """, (RECENT_WINDOW,))
         
-        # Data exfiltration
-        alerts = self.detect_data_exfiltration()
-        total_alerts += alerts
-        if alerts:
-            print(f"   ✅ Data exfiltration detection: {alerts} alert(s)")
+        # All alerts from this cycle are committed together on exit
+        with self.db_conn:
+            try:
+                # Port scan detection
+                alerts = self.detect_port_scan(table=RECENT_TABLE)
+                total_alerts += alerts
+                if alerts:
+                    print(f"   ✅ Port scan detection: {alerts} alert(s)")
+                
+                # Traffic spike detection
+                if self.detect_traffic_spike(table=RECENT_TABLE):
+                    total_alerts += 1
+                    print(f"   ✅ Traffic spike detection: 1 alert")
+                
+                # Unusual protocol detection (1 hour window, reads traffic_events)
+                alerts = self.detect_unusual_protocol()
+                total_alerts += alerts
+                if alerts:
+                    print(f"   ✅ Unusual protocol detection: {alerts} alert(s)")
+                
+                # Failed connections
+                alerts = self.detect_failed_connections(table=RECENT_TABLE)
+                total_alerts += alerts
+                if alerts:
+                    print(f"   ✅ Connection flood detection: {alerts} alert(s)")
+                
+                # Data exfiltration
+                alerts = self.detect_data_exfiltration(table=RECENT_TABLE)
+                total_alerts += alerts
+                if alerts:
+                    print(f"   ✅ Data exfiltration detection: {alerts} alert(s)")
+            finally:
+                cursor.execute(f"DROP TABLE IF EXISTS {RECENT_TABLE}")
         
         if total_alerts == 0:
             print("   ✅ No anomalies detected - all systems normal")
@@ -355,8 +442,9 @@ class AnomalyDetector:
         return total_alerts
     
     def close(self):
-        """Close database connection"""
+        """Commit any pending alerts and close database connection"""
         if self.db_conn:
+            self.db_conn.commit()
             self.db_conn.close()
 
 if __name__ == "__main__":
@@ -4,19 +4,96 @@ Web Dashboard for NetSecMonitor
 Provides real-time visualization of network traffic and security alerts
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, request, g, Response
+import argparse
+import hashlib
+import orjson
+import queue
 import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 import json
 
+from db import open_db, ensure_schema
+
 app = Flask(__name__)
 DB_PATH = "netsec_monitor.db"
 
+# Long-lived read-only connections shared across requests
+POOL_SIZE = 8
+_pool = queue.Queue(maxsize=POOL_SIZE)
+_pool_opened = 0
+_pool_lock = threading.Lock()
+_schema_ready = False
+
+# Seconds an aggregate result is reused before the database is queried again
+OVERVIEW_TTL = 5
+TIMELINE_TTL = 30
+
+# Seconds a browser may reuse an API response before revalidating its ETag
+CACHE_MAX_AGE = 5
+
+def prepare_schema():
+    """Upgrade the schema once through a short-lived read-write connection"""
+    global _schema_ready
+    if not _schema_ready:
+        conn = open_db(DB_PATH)
+        try:
+            ensure_schema(conn)
+        finally:
+            conn.close()
+        _schema_ready = True
+
+def acquire_connection():
+    """Take a connection from the pool, opening one if the pool is not full yet"""
+    global _pool_opened
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        pass
+    
+    with _pool_lock:
+        if _pool_opened < POOL_SIZE:
+            prepare_schema()
+            # Every endpoint only reads, so never take the WAL write lock
+            conn = open_db(DB_PATH, readonly=True,
+                           check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            _pool_opened += 1
+            return conn
+    
+    # Pool exhausted: wait for another request to release one
+    return _pool.get()
+
 def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get the pooled database connection for the current request"""
+    if 'db' not in g:
+        g.db = acquire_connection()
+    return g.db
+
+@app.teardown_appcontext
+def release_db(exception=None):
+    """Return the request's connection to the pool"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        _pool.put(conn)
+
+def fast_json(data):
+    """
+    JSON response serialized by orjson in a single bytes object
+    Tagged with a content hash so unchanged polls get an empty 304
+    """
+    body = orjson.dumps(data)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.blake2b(body, digest_size=8).hexdigest())
+    response.headers['Cache-Control'] = f'max-age={CACHE_MAX_AGE}, must-revalidate'
+    return response.make_conditional(request)
+
+def ttl_bucket(ttl):
+    """Cache key component that changes every ttl seconds"""
+    return int(time.time()) // ttl
 
 @app.route('/')
 def index():
@@ -26,42 +103,32 @@ def index():
 @app.route('/api/stats/overview')
 def stats_overview():
     """Get overview statistics"""
+    return fast_json(cached_overview(ttl_bucket(OVERVIEW_TTL)))
+
+@lru_cache(maxsize=128)
+def cached_overview(bucket):
+    """Overview counts in a single round trip, cached per TTL bucket"""
     conn = get_db()
     cursor = conn.cursor()
     
-    # Total packets
-    cursor.execute("SELECT COUNT(*) FROM traffic_events")
-    total_packets = cursor.fetchone()[0]
-    
-    # Packets last hour
-    cursor.execute("""
-        SELECT COUNT(*) FROM traffic_events 
-        WHERE timestamp > datetime('now', '-1 hour')
-    """)
-    packets_last_hour = cursor.fetchone()[0]
-    
-    # Open alerts
     cursor.execute("""
-        SELECT COUNT(*) FROM security_alerts 
-        WHERE status = 'open'
+        SELECT
+            (SELECT COUNT(*) FROM traffic_events),
+            (SELECT COUNT(*) FROM traffic_events
+             WHERE timestamp > datetime('now', '-1 hour')),
+            (SELECT COUNT(*) FROM security_alerts
+             WHERE status = 'open'),
+            (SELECT COUNT(DISTINCT source_ip) FROM traffic_events
+             WHERE timestamp > datetime('now', '-24 hours'))
     """)
-    open_alerts = cursor.fetchone()[0]
+    total_packets, packets_last_hour, open_alerts, unique_ips = cursor.fetchone()
     
-    # Unique IPs last 24h
-    cursor.execute("""
-        SELECT COUNT(DISTINCT source_ip) FROM traffic_events
-        WHERE timestamp > datetime('now', '-24 hours')
-    """)
-    unique_ips = cursor.fetchone()[0]
-    
-    conn.close()
-    
-    return jsonify({
+    return {
         'total_packets': total_packets,
         'packets_last_hour': packets_last_hour,
         'open_alerts': open_alerts,
         'unique_ips': unique_ips
-    })
+    }
 
 @app.route('/api/traffic/recent')
 def traffic_recent():
@@ -79,109 +146,98 @@ def traffic_recent():
         LIMIT ?
     """, (limit,))
     
-    events = []
-    for row in cursor.fetchall():
-        events.append({
-            'timestamp': row[0],
-            'source_ip': row[1],
-            'destination_ip': row[2],
-            'protocol': row[3],
-            'packet_size': row[4],
-            'source_port': row[5],
-            'destination_port': row[6]
-        })
-    
-    conn.close()
-    return jsonify(events)
+    events = [dict(row) for row in cursor]
+    
+    return fast_json(events)
 
 @app.route('/api/traffic/timeline')
 def traffic_timeline():
     """Get traffic volume over time"""
     hours = request.args.get('hours', 24, type=int)
     
+    return fast_json(cached_timeline(hours, ttl_bucket(TIMELINE_TTL)))
+
+@lru_cache(maxsize=128)
+def cached_timeline(hours, bucket):
+    """Timeline buckets, cached per TTL bucket"""
     conn = get_db()
     cursor = conn.cursor()
     
+    # Rollup minutes are keyed on the monitor's local-time timestamps
     cursor.execute("""
         SELECT 
-            strftime('%Y-%m-%d %H:%M', timestamp) as time_bucket,
-            COUNT(*) as packet_count,
-            SUM(packet_size) as total_bytes
-        FROM traffic_events
-        WHERE timestamp > datetime('now', ?)
-        GROUP BY time_bucket
-        ORDER BY time_bucket
+            minute_ts as time,
+            SUM(packets) as packets,
+            SUM(bytes) as bytes
+        FROM traffic_minute_rollup
+        WHERE minute_ts >= strftime('%Y-%m-%d %H:%M', 'now', 'localtime', ?)
+        GROUP BY minute_ts
+        ORDER BY minute_ts
     """, (f'-{hours} hours',))
     
-    timeline = []
-    for row in cursor.fetchall():
-        timeline.append({
-            'time': row[0],
-            'packets': row[1],
-            'bytes': row[2]
-        })
+    # Column-oriented so the chart can plot the arrays directly
+    timeline = {'time': [], 'packets': [], 'bytes': []}
+    for row in cursor:
+        timeline['time'].append(row['time'])
+        timeline['packets'].append(row['packets'])
+        timeline['bytes'].append(row['bytes'])
     
-    conn.close()
-    return jsonify(timeline)
+    return timeline
 
 @app.route('/api/protocols/distribution')
 def protocol_distribution():
     """Get protocol distribution"""
     hours = request.args.get('hours', 24, type=int)
     
+    return fast_json(cached_protocol_distribution(hours, ttl_bucket(TIMELINE_TTL)))
+
+@lru_cache(maxsize=128)
+def cached_protocol_distribution(hours, bucket):
+    """Protocol counts, cached per TTL bucket"""
     conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute("""
-        SELECT protocol, COUNT(*) as count
-        FROM traffic_events
-        WHERE timestamp > datetime('now', ?)
+        SELECT protocol, SUM(packets) as count
+        FROM traffic_minute_rollup
+        WHERE minute_ts >= strftime('%Y-%m-%d %H:%M', 'now', 'localtime', ?)
         GROUP BY protocol
         ORDER BY count DESC
     """, (f'-{hours} hours',))
     
-    protocols = []
-    for row in cursor.fetchall():
-        protocols.append({
-            'protocol': row[0],
-            'count': row[1]
-        })
+    protocols = [dict(row) for row in cursor]
     
-    conn.close()
-    return jsonify(protocols)
+    return protocols
 
 @app.route('/api/top-talkers')
 def top_talkers():
     """Get most active IP addresses"""
     limit = request.args.get('limit', 10, type=int)
     
+    return fast_json(cached_top_talkers(limit, ttl_bucket(OVERVIEW_TTL)))
+
+@lru_cache(maxsize=128)
+def cached_top_talkers(limit, bucket):
+    """Top source IPs, cached per TTL bucket"""
     conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute("""
         SELECT 
-            source_ip,
-            COUNT(*) as packet_count,
-            SUM(packet_size) as total_bytes,
+            source_ip as ip,
+            COUNT(*) as packets,
+            SUM(packet_size) as bytes,
             MAX(timestamp) as last_seen
         FROM traffic_events
         WHERE timestamp > datetime('now', '-1 hour')
         GROUP BY source_ip
-        ORDER BY packet_count DESC
+        ORDER BY packets DESC
         LIMIT ?
     """, (limit,))
     
-    talkers = []
-    for row in cursor.fetchall():
-        talkers.append({
-            'ip': row[0],
-            'packets': row[1],
-            'bytes': row[2],
-            'last_seen': row[3]
-        })
-    
-    conn.close()
-    return jsonify(talkers)
+    talkers = [dict(row) for row in cursor]
+    
+    return talkers
 
 @app.route('/api/alerts/recent')
 def alerts_recent():
@@ -192,35 +248,27 @@ def alerts_recent():
     cursor = conn.cursor()
     
     cursor.execute("""
-        SELECT id, timestamp, alert_type, severity, source_ip,
+        SELECT id, timestamp, alert_type as type, severity, source_ip,
                destination_ip, description, details, status
         FROM security_alerts
         ORDER BY timestamp DESC
         LIMIT ?
     """, (limit,))
     
-    alerts = []
-    for row in cursor.fetchall():
-        alerts.append({
-            'id': row[0],
-            'timestamp': row[1],
-            'type': row[2],
-            'severity': row[3],
-            'source_ip': row[4],
-            'destination_ip': row[5],
-            'description': row[6],
-            'details': row[7],
-            'status': row[8]
-        })
-    
-    conn.close()
-    return jsonify(alerts)
+    alerts = [dict(row) for row in cursor]
+    
+    return fast_json(alerts)
 
 @app.route('/api/alerts/by-severity')
 def alerts_by_severity():
     """Get alert counts by severity"""
     hours = request.args.get('hours', 24, type=int)
     
+    return fast_json(cached_alerts_by_severity(hours, ttl_bucket(OVERVIEW_TTL)))
+
+@lru_cache(maxsize=128)
+def cached_alerts_by_severity(hours, bucket):
+    """Alert counts by severity, cached per TTL bucket"""
     conn = get_db()
     cursor = conn.cursor()
     
@@ -231,12 +279,9 @@ def alerts_by_severity():
         GROUP BY severity
     """, (f'-{hours} hours',))
     
-    severity_counts = {}
-    for row in cursor.fetchall():
-        severity_counts[row[0]] = row[1]
+    severity_counts = {severity: count for severity, count in cursor}
     
-    conn.close()
-    return jsonify(severity_counts)
+    return severity_counts
 
 @app.route('/api/ports/scans')
 def port_scans():
@@ -247,7 +292,7 @@ def port_scans():
     cursor = conn.cursor()
     
     cursor.execute("""
-        SELECT scan_timestamp, target_ip, port, status, 
+        SELECT scan_timestamp as timestamp, target_ip as target, port, status, 
                service, response_time
         FROM port_scans
         WHERE status = 'open'
@@ -255,21 +300,28 @@ def port_scans():
         LIMIT ?
     """, (limit,))
     
-    scans = []
-    for row in cursor.fetchall():
-        scans.append({
-            'timestamp': row[0],
-            'target': row[1],
-            'port': row[2],
-            'status': row[3],
-            'service': row[4],
-            'response_time': row[5]
-        })
-    
-    conn.close()
-    return jsonify(scans)
+    scans = [dict(row) for row in cursor]
+    
+    return fast_json(scans)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='NetSecMonitor Web Dashboard'
+    )
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=POOL_SIZE,
+        help=f'Number of request worker threads (default: {POOL_SIZE})'
+    )
+    parser.add_argument(
+        '--debug',
+        action='store_true',
+        help='Run the Flask development server with the debugger instead'
+    )
+    
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("NetSecMonitor - Web Dashboard")
     print("=" * 60)
@@ -277,4 +329,9 @@ if __name__ == "__main__":
     print("📊 Dashboard will be available at: http://localhost:5000")
     print("Press Ctrl+C to stop\n")
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    if args.debug:
+        app.run(host='0.0.0.0', port=5000, debug=True)
+    else:
+        # Threaded WSGI server; each worker checks out a pooled connection
+        from waitress import serve
+        serve(app, host='0.0.0.0', port=5000, threads=args.threads)
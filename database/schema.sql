@@ -14,7 +14,10 @@ CREATE TABLE IF NOT EXISTS traffic_events (
     packet_size INTEGER,
     flags TEXT,  -- TCP flags if applicable
     payload_preview TEXT,  -- First 100 chars (sanitized)
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    source_ip_int INTEGER,  -- IPv4 source as integer for range checks (NULL for IPv6)
+    destination_ip_int INTEGER,  -- IPv4 destination as integer
+    is_syn INTEGER GENERATED ALWAYS AS (instr(flags, 'SYN') > 0) VIRTUAL  -- Indexable SYN flag
 );
 
 -- Index for fast time-based queries
@@ -23,6 +26,34 @@ CREATE INDEX IF NOT EXISTS idx_traffic_source ON traffic_events(source_ip);
 CREATE INDEX IF NOT EXISTS idx_traffic_dest ON traffic_events(destination_ip);
 CREATE INDEX IF NOT EXISTS idx_traffic_protocol ON traffic_events(protocol);
 
+-- Composite indexes for detector and dashboard time-window queries
+CREATE INDEX IF NOT EXISTS idx_events_ts_cover ON traffic_events(timestamp, source_ip, destination_ip, packet_size);
+CREATE INDEX IF NOT EXISTS idx_events_ts_proto ON traffic_events(timestamp, protocol);
+CREATE INDEX IF NOT EXISTS idx_events_src_dst_port ON traffic_events(source_ip, destination_ip, destination_port, timestamp);
+CREATE INDEX IF NOT EXISTS idx_events_syn_ts ON traffic_events(timestamp) WHERE is_syn = 1;
+CREATE INDEX IF NOT EXISTS idx_events_src_int_ts ON traffic_events(source_ip_int, timestamp);
+
+-- Per-Minute Traffic Rollup Table
+-- Maintained by trigger so timelines and baselines read minutes, not packets
+CREATE TABLE IF NOT EXISTS traffic_minute_rollup (
+    minute_ts TEXT NOT NULL,  -- strftime('%Y-%m-%d %H:%M', timestamp)
+    protocol TEXT NOT NULL,
+    source_ip TEXT NOT NULL,
+    packets INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (minute_ts, protocol, source_ip)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_traffic_minute_rollup
+AFTER INSERT ON traffic_events
+BEGIN
+    INSERT INTO traffic_minute_rollup (minute_ts, protocol, source_ip, packets, bytes)
+    VALUES (strftime('%Y-%m-%d %H:%M', COALESCE(NEW.timestamp, 'now')),
+            NEW.protocol, NEW.source_ip, 1, COALESCE(NEW.packet_size, 0))
+    ON CONFLICT (minute_ts, protocol, source_ip)
+    DO UPDATE SET packets = packets + 1, bytes = bytes + excluded.bytes;
+END;
+
 -- Security Alerts Table
 -- Stores detected anomalies and security events
 CREATE TABLE IF NOT EXISTS security_alerts (
@@ -43,6 +74,11 @@ CREATE TABLE IF NOT EXISTS security_alerts (
 CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON security_alerts(timestamp);
 CREATE INDEX IF NOT EXISTS idx_alerts_severity ON security_alerts(severity);
 CREATE INDEX IF NOT EXISTS idx_alerts_status ON security_alerts(status);
+CREATE INDEX IF NOT EXISTS idx_alerts_type_src_ts ON security_alerts(alert_type, source_ip, timestamp, status);
+
+-- Suppress duplicate open alerts of the same type and source per 10 minute bucket
+-- NULL source_ip values never conflict, so source-less alerts are not suppressed
+CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_dedup ON security_alerts(alert_type, source_ip, CAST(strftime('%s', timestamp) / 600 AS INTEGER)) WHERE status = 'open';
 
 -- Port Scan Results Table
 -- Stores results from port scanning activities
@@ -106,7 +142,9 @@ CREATE TABLE IF NOT EXISTS baseline_profiles (
     std_deviation REAL,
     threshold_high REAL,
     threshold_low REAL,
-    last_updated DATETIME DEFAULT CURRENT_TIMESTAMP,
+    sample_count INTEGER DEFAULT 0,  -- Samples folded into baseline_value (running mean)
+    sum_sq_diff REAL DEFAULT 0,  -- Welford M2 accumulator for std_deviation
+    last_updated DATETIME DEFAULT CURRENT_TIMESTAMP,  -- End of the last folded interval
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -165,7 +203,7 @@ SELECT
     protocol,
     COUNT(*) as count,
     SUM(packet_size) as total_bytes,
-    ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM traffic_events WHERE timestamp > datetime('now', '-24 hours')), 2) as percentage
+    ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) as percentage
 FROM traffic_events
 WHERE timestamp > datetime('now', '-24 hours')
 GROUP BY protocol
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Database Helpers
+Shared SQLite connection setup for NetSecMonitor components
+
+Applies the connection tuning PRAGMAs and brings databases created by
+older versions of schema.sql up to date with the current tables, columns
+and indexes.
+"""
+
+import socket
+import sqlite3
+
+DB_PATH = "netsec_monitor.db"
+
+# Connection tuning applied once per connection
+# WAL lets the dashboard and detectors read while the monitor writes
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",  # 64 MiB page cache
+    "PRAGMA mmap_size=268435456",
+)
+
+# Columns added after the first schema release: (table, column, definition)
+# Kept in sync with database/schema.sql
+COLUMNS = (
+    ("traffic_events", "is_syn",
+     "INTEGER GENERATED ALWAYS AS (instr(flags, 'SYN') > 0) VIRTUAL"),
+    ("traffic_events", "source_ip_int", "INTEGER"),
+    ("traffic_events", "destination_ip_int", "INTEGER"),
+    ("baseline_profiles", "sample_count", "INTEGER DEFAULT 0"),
+    ("baseline_profiles", "sum_sq_diff", "REAL DEFAULT 0"),
+)
+
+# Tables and triggers added after the first schema release:
+# (name, create statement, backfill statement or None), created in order
+# Kept in sync with database/schema.sql
+OBJECTS = (
+    ("traffic_minute_rollup", """
+        CREATE TABLE IF NOT EXISTS traffic_minute_rollup (
+            minute_ts TEXT NOT NULL,  -- strftime('%Y-%m-%d %H:%M', timestamp)
+            protocol TEXT NOT NULL,
+            source_ip TEXT NOT NULL,
+            packets INTEGER NOT NULL DEFAULT 0,
+            bytes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (minute_ts, protocol, source_ip)
+        ) WITHOUT ROWID
+    """, """
+        INSERT INTO traffic_minute_rollup (minute_ts, protocol, source_ip, packets, bytes)
+        SELECT strftime('%Y-%m-%d %H:%M', timestamp), protocol, source_ip,
+               COUNT(*), COALESCE(SUM(packet_size), 0)
+        FROM traffic_events
+        WHERE strftime('%Y-%m-%d %H:%M', timestamp) IS NOT NULL
+        GROUP BY 1, 2, 3
+    """),
+    ("trg_traffic_minute_rollup", """
+        CREATE TRIGGER IF NOT EXISTS trg_traffic_minute_rollup
+        AFTER INSERT ON traffic_events
+        BEGIN
+            INSERT INTO traffic_minute_rollup (minute_ts, protocol, source_ip, packets, bytes)
+            VALUES (strftime('%Y-%m-%d %H:%M', COALESCE(NEW.timestamp, 'now')),
+                    NEW.protocol, NEW.source_ip, 1, COALESCE(NEW.packet_size, 0))
+            ON CONFLICT (minute_ts, protocol, source_ip)
+            DO UPDATE SET packets = packets + 1, bytes = bytes + excluded.bytes;
+        END
+    """, None),
+)
+
+# Fill newly added columns from existing data
+BACKFILLS = {
+    ("traffic_events", "source_ip_int"):
+        "UPDATE traffic_events SET source_ip_int = ip_to_int(source_ip)",
+    ("traffic_events", "destination_ip_int"):
+        "UPDATE traffic_events SET destination_ip_int = ip_to_int(destination_ip)",
+}
+
+# Composite indexes for the hot timestamp/source_ip predicates
+# Kept in sync with database/schema.sql
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_events_ts_cover "
+    "ON traffic_events(timestamp, source_ip, destination_ip, packet_size)",
+    "CREATE INDEX IF NOT EXISTS idx_events_ts_proto ON traffic_events(timestamp, protocol)",
+    "CREATE INDEX IF NOT EXISTS idx_events_src_dst_port "
+    "ON traffic_events(source_ip, destination_ip, destination_port, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_events_syn_ts ON traffic_events(timestamp) WHERE is_syn = 1",
+    "CREATE INDEX IF NOT EXISTS idx_events_src_int_ts ON traffic_events(source_ip_int, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_alerts_type_src_ts "
+    "ON security_alerts(alert_type, source_ip, timestamp, status)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_dedup "
+    "ON security_alerts(alert_type, source_ip, CAST(strftime('%s', timestamp) / 600 AS INTEGER)) "
+    "WHERE status = 'open'",
+)
+
+# Open alerts that would stop idx_alerts_dedup from building on an older
+# database: keep the newest per type, source and 10 minute bucket and mark
+# the rest as false positives
+DEDUP_CLEANUP = """
+    UPDATE security_alerts SET status = 'false_positive'
+    WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY alert_type, source_ip, CAST(strftime('%s', timestamp) / 600 AS INTEGER)
+                ORDER BY timestamp DESC, id DESC
+            ) AS rank
+            FROM security_alerts
+            WHERE status = 'open' AND alert_type IS NOT NULL AND source_ip IS NOT NULL
+              AND strftime('%s', timestamp) IS NOT NULL
+        )
+        WHERE rank > 1
+    )
+"""
+
+# Indexes made redundant by a wider one above
+DROPPED_INDEXES = (
+    "idx_events_ts_src",  # Prefix of idx_events_ts_cover
+)
+
+# Prepared statements kept per connection, keyed by SQL text
+# All queries bind their parameters, so the text repeats and hits this cache
+CACHED_STATEMENTS = 256
+
+def ip_to_int(ip):
+    """Convert a dotted IPv4 address to an integer, None for anything else"""
+    try:
+        return int.from_bytes(socket.inet_aton(ip), 'big')
+    except (OSError, TypeError):
+        return None
+
+def open_db(path=DB_PATH, readonly=False, **kwargs):
+    """
+    Open a database connection with the tuning PRAGMAs applied
+    Read-only connections need the file already in WAL mode, so open one
+    read-write connection and run ensure_schema() before the first of them
+    """
+    kwargs.setdefault('cached_statements', CACHED_STATEMENTS)
+    if readonly:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, **kwargs)
+    else:
+        conn = sqlite3.connect(path, **kwargs)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def ensure_schema(conn):
+    """Add any tables, columns and indexes missing from databases built by an older schema"""
+    conn.create_function("ip_to_int", 1, ip_to_int, deterministic=True)
+    for table, column, definition in COLUMNS:
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_xinfo({table})")}
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            if (table, column) in BACKFILLS:
+                conn.execute(BACKFILLS[(table, column)])
+    for name, create, backfill in OBJECTS:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+        if not exists:
+            conn.execute(create)
+            if backfill:
+                conn.execute(backfill)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_alerts_dedup'").fetchone():
+        resolved = conn.execute(DEDUP_CLEANUP).rowcount
+        if resolved:
+            print(f"🧹 Marked {resolved} duplicate open alerts as false positives")
+    for statement in INDEXES:
+        try:
+            conn.execute(statement)
+        except sqlite3.IntegrityError as e:
+            # Unique indexes cannot be built over rows that already conflict
+            print(f"⚠️  Skipped index ({e}): resolve duplicate open alerts to enable it")
+    for name in DROPPED_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
@@ -8,18 +8,22 @@ import sqlite3
 import argparse
 from datetime import datetime, timedelta
 
+from db import open_db, ensure_schema
+
 DB_PATH = "netsec_monitor.db"
 
 class ReportGenerator:
     """Generate security and network analysis reports"""
     
     def __init__(self):
-        self.db_conn = sqlite3.connect(DB_PATH)
+        self.db_conn = open_db(DB_PATH)
+        ensure_schema(self.db_conn)
         self.db_conn.row_factory = sqlite3.Row
     
     def generate_summary_report(self, hours=24):
         """Generate executive summary report"""
         cursor = self.db_conn.cursor()
+        interval = f'-{hours} hours'  # Bound parameter shared by every query
         
         print("=" * 70)
         print(f"NetSecMonitor - Security Summary Report")
@@ -32,15 +36,20 @@ class ReportGenerator:
         print("📊 TRAFFIC OVERVIEW")
         print("-" * 70)
         
+        # Totals come from the per-minute rollup; only the destination count
+        # still needs the raw rows (unary + keeps it on the covering index).
+        # Both are bounded on the same local-time minute as the monitor's timestamps
         cursor.execute("""
             SELECT 
-                COUNT(*) as total_packets,
-                SUM(packet_size) as total_bytes,
+                COALESCE(SUM(packets), 0) as total_packets,
+                COALESCE(SUM(bytes), 0) as total_bytes,
                 COUNT(DISTINCT source_ip) as unique_sources,
-                COUNT(DISTINCT destination_ip) as unique_destinations
-            FROM traffic_events
-            WHERE timestamp > datetime('now', ?)
-        """, (f'-{hours} hours',))
+                (SELECT COUNT(DISTINCT +destination_ip) FROM traffic_events
+                 WHERE timestamp >= strftime('%Y-%m-%dT%H:%M', 'now', 'localtime', :interval))
+                    as unique_destinations
+            FROM traffic_minute_rollup
+            WHERE minute_ts >= strftime('%Y-%m-%d %H:%M', 'now', 'localtime', :interval)
+        """, {'interval': interval})
         
         row = cursor.fetchone()
         print(f"Total Packets:        {row['total_packets']:,}")
@@ -54,17 +63,16 @@ class ReportGenerator:
         print("-" * 70)
         
         cursor.execute("""
-            SELECT protocol, COUNT(*) as count,
-                   COUNT(*) * 100.0 / (SELECT COUNT(*) FROM traffic_events 
-                                        WHERE timestamp > datetime('now', ?)) as percentage
-            FROM traffic_events
-            WHERE timestamp > datetime('now', ?)
+            SELECT protocol, SUM(packets) as count,
+                   SUM(packets) * 100.0 / SUM(SUM(packets)) OVER () as percentage
+            FROM traffic_minute_rollup
+            WHERE minute_ts >= strftime('%Y-%m-%d %H:%M', 'now', 'localtime', ?)
             GROUP BY protocol
             ORDER BY count DESC
             LIMIT 10
-        """, (f'-{hours} hours', f'-{hours} hours'))
+        """, (interval,))
         
-        for row in cursor.fetchall():
+        for row in cursor:
             bar = '█' * int(row['percentage'])
             print(f"{row['protocol']:<15} {row['count']:>8,} packets  {row['percentage']:>5.1f}% {bar}")
         print()
@@ -85,10 +93,10 @@ class ReportGenerator:
                     WHEN 'medium' THEN 3
                     WHEN 'low' THEN 4
                 END
-        """, (f'-{hours} hours',))
+        """, (interval,))
         
         total_alerts = 0
-        for row in cursor.fetchall():
+        for row in cursor:
             print(f"{row['severity'].upper():<12} {row['count']:>5} alert(s)")
             total_alerts += row['count']
         
@@ -108,9 +116,9 @@ class ReportGenerator:
                 GROUP BY alert_type
                 ORDER BY count DESC
                 LIMIT 5
-            """, (f'-{hours} hours',))
+            """, (interval,))
             
-            for row in cursor.fetchall():
+            for row in cursor:
                 print(f"{row['alert_type']:<30} {row['count']:>5} occurrence(s)")
             print()
         
@@ -119,17 +127,17 @@ class ReportGenerator:
         print("-" * 70)
         
         cursor.execute("""
-            SELECT source_ip, COUNT(*) as packets, SUM(packet_size) as bytes
-            FROM traffic_events
-            WHERE timestamp > datetime('now', ?)
+            SELECT source_ip, SUM(packets) as packets, SUM(bytes) as bytes
+            FROM traffic_minute_rollup
+            WHERE minute_ts >= strftime('%Y-%m-%d %H:%M', 'now', 'localtime', ?)
             GROUP BY source_ip
             ORDER BY packets DESC
             LIMIT 10
-        """, (f'-{hours} hours',))
+        """, (interval,))
         
         print(f"{'IP Address':<20} {'Packets':>12} {'Data':>12}")
         print("-" * 70)
-        for row in cursor.fetchall():
+        for row in cursor:
             mb = row['bytes'] / 1048576
             print(f"{row['source_ip']:<20} {row['packets']:>12,} {mb:>11.2f} MB")
         print()
@@ -142,7 +150,7 @@ class ReportGenerator:
             AND severity IN ('critical', 'high')
             ORDER BY timestamp DESC
             LIMIT 10
-        """, (f'-{hours} hours',))
+        """, (interval,))
         
         critical_alerts = cursor.fetchall()
         
@@ -165,24 +173,21 @@ class ReportGenerator:
         else:
             print("⚠️  Review and investigate security alerts listed above")
         
-        # Check for port scans
+        # Check for port scans and traffic spikes in one pass
         cursor.execute("""
-            SELECT COUNT(*) FROM security_alerts
-            WHERE alert_type = 'port_scan'
+            SELECT 
+                COUNT(CASE WHEN alert_type = 'port_scan' THEN 1 END) as port_scans,
+                COUNT(CASE WHEN alert_type = 'traffic_spike' THEN 1 END) as traffic_spikes
+            FROM security_alerts
+            WHERE alert_type IN ('port_scan', 'traffic_spike')
             AND timestamp > datetime('now', ?)
-        """, (f'-{hours} hours',))
+        """, (interval,))
         
-        if cursor.fetchone()[0] > 0:
+        row = cursor.fetchone()
+        if row['port_scans'] > 0:
             print("⚠️  Port scanning activity detected - review firewall rules")
         
-        # Check for traffic spikes
-        cursor.execute("""
-            SELECT COUNT(*) FROM security_alerts
-            WHERE alert_type = 'traffic_spike'
-            AND timestamp > datetime('now', ?)
-        """, (f'-{hours} hours',))
-        
-        if cursor.fetchone()[0] > 0:
+        if row['traffic_spikes'] > 0:
             print("⚠️  Unusual traffic spikes detected - investigate source")
         
         print()
@@ -30,8 +30,8 @@ def init_database():
         with open(SCHEMA_PATH, 'r') as f:
             schema_sql = f.read()
         
-        cursor.executescript(schema_sql)
-        conn.commit()
+        # One transaction for the whole script instead of one sync per statement
+        cursor.executescript(f"BEGIN;\n{schema_sql}\nCOMMIT;")
         
         # Verify tables were created
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
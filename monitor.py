@@ -7,159 +7,376 @@ IMPORTANT: This script requires root/sudo privileges for packet capture
 Usage: sudo python monitor.py
 """
 
+import argparse
+import socket
 import sqlite3
+import struct
 import time
 import signal
 import sys
 from datetime import datetime
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
+import multiprocessing
 
-# Note: scapy would normally be imported here, but for safety we'll use simulated data
-# from scapy.all import sniff, IP, TCP, UDP, ICMP
+import numpy as np
+
+from db import open_db, ensure_schema, ip_to_int
+
+# Note: scapy is only imported for live capture (--iface); the default run
+# uses simulated data
 
 DB_PATH = "netsec_monitor.db"
 
+# Captured events are held in memory and written in batches: whichever limit
+# is hit first. The interval is also the most data a crash can lose.
+FLUSH_BATCH_SIZE = 1000  # events
+FLUSH_INTERVAL = 1.0     # seconds
+
+# Port scan heuristic: distinct destination ports per source in a window
+PORT_SCAN_WINDOW = 300   # seconds
+PORT_SCAN_THRESHOLD = 20
+
+# Spawned rather than forked so the detector never inherits the monitor's connection
+_mp = multiprocessing.get_context('spawn')
+
+# Simulated events are drawn this many at a time with NumPy
+SIMULATION_BATCH_SIZE = 10000
+
+# Protocols broken out in network_stats, mapped to their minute bucket key
+STATS_PROTOCOLS = {'TCP': 'tcp', 'UDP': 'udp', 'ICMP': 'icmp'}
+
+# Hot-path statements, kept as constants so the connection's statement
+# cache always sees the same text and reuses the prepared program
+_INSERT_TRAFFIC_SQL = """
+    INSERT INTO traffic_events 
+    (timestamp, source_ip, destination_ip, source_port, destination_port, 
+     protocol, packet_size, flags, payload_preview,
+     source_ip_int, destination_ip_int)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_INSERT_ALERT_SQL = """
+    INSERT OR IGNORE INTO security_alerts
+    (timestamp, alert_type, severity, source_ip, description, details)
+    VALUES (datetime('now'), ?, ?, ?, ?, ?)
+"""
+
+# TCP flag bits, named the way the flags column stores them
+TCP_FLAGS = (
+    (0x01, 'FIN'),
+    (0x02, 'SYN'),
+    (0x04, 'RST'),
+    (0x08, 'PSH'),
+    (0x10, 'ACK'),
+    (0x20, 'URG'),
+)
+
+def tcp_flag_names(bits):
+    """Comma-separated flag names for a TCP flags byte, e.g. 'SYN,ACK'"""
+    return ','.join(name for bit, name in TCP_FLAGS if bits & bit)
+
+# Fixed IPv4 header fields: version/IHL, TOS, total length, ID, flags/fragment
+# offset, TTL, protocol, checksum, source, destination
+IPV4_HEADER = struct.Struct('!BBHHHBBH4s4s')
+L4_PORTS = struct.Struct('!HH')
+IP_PROTOCOLS = {1: 'ICMP', 6: 'TCP', 17: 'UDP'}
+ETH_P_IP = 0x0800
+
+def parse_ipv4(buf):
+    """
+    Decode the IPv4 and TCP/UDP headers of a raw packet
+    Returns: (source_ip, destination_ip, protocol, source_port,
+              destination_port, packet_size, flags), or None if not IPv4
+    """
+    if len(buf) < IPV4_HEADER.size:
+        return None
+    
+    (version_ihl, _, total_length, _, fragment, _,
+     proto, _, source, destination) = IPV4_HEADER.unpack_from(buf)
+    if version_ihl >> 4 != 4:
+        return None
+    
+    header_length = (version_ihl & 0x0f) * 4
+    source_port = destination_port = None
+    flags = ''
+    
+    # Only the first fragment carries the transport header
+    if proto in (6, 17) and not fragment & 0x1fff and len(buf) >= header_length + 4:
+        source_port, destination_port = L4_PORTS.unpack_from(buf, header_length)
+        if proto == 6 and len(buf) > header_length + 13:
+            flags = tcp_flag_names(buf[header_length + 13])
+    
+    return (socket.inet_ntoa(source), socket.inet_ntoa(destination),
+            IP_PROTOCOLS.get(proto, str(proto)), source_port, destination_port,
+            total_length, flags)
+
+# Date and time part of the current second, formatted once per second
+_ts_second = None
+_ts_prefix = None
+
+def event_timestamp(now=None):
+    """
+    ISO timestamp like datetime.isoformat() for a time.time() value
+    Only the microseconds are formatted per packet
+    """
+    global _ts_second, _ts_prefix
+    if now is None:
+        now = time.time()
+    second = int(now)
+    if second != _ts_second:
+        _ts_prefix = datetime.fromtimestamp(second).strftime('%Y-%m-%dT%H:%M:%S')
+        _ts_second = second
+    return f"{_ts_prefix}.{int((now - second) * 1000000):06d}"
+
+class DetectorProcess(_mp.Process):
+    """
+    Anomaly detection in its own process with its own database connection
+    The monitor sends it a (source_ip, destination_port) list per flushed
+    batch, so heavier detection never competes with capture for the GIL
+    """
+    
+    def __init__(self, db_path=DB_PATH):
+        super().__init__(name='netsec-detector', daemon=True)
+        self.db_path = db_path
+        self.events = _mp.Queue()
+    
+    def run(self):
+        """Check batches until the monitor sends None"""
+        # Ctrl+C reaches the whole process group; the monitor decides when to stop
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        
+        self.db_conn = open_db(self.db_path)
+        self._alert_cursor = self.db_conn.cursor()
+        # Sliding window per source IP: (seen_at, port) in arrival order,
+        # plus how many of those entries each port has
+        self._ip_ports = defaultdict(deque)
+        self._ip_port_counts = defaultdict(Counter)
+        last_sweep = time.time()
+        
+        try:
+            for batch in iter(self.events.get, None):
+                now = time.time()
+                for source_ip, port in batch:
+                    self.check_anomalies(source_ip, port, now)
+                
+                # Forget sources that have gone quiet
+                if now - last_sweep > 60:
+                    for source_ip in list(self._ip_ports):
+                        self.expire_ports(source_ip, now)
+                    last_sweep = now
+        
+        finally:
+            self.db_conn.close()
+    
+    def check_anomalies(self, source_ip, port, now):
+        """
+        Basic anomaly detection
+        In production, this would use statistical analysis and ML
+        """
+        # Example: Detect potential port scan
+        window = self._ip_ports[source_ip]
+        port_counts = self._ip_port_counts[source_ip]
+        window.append((now, port))
+        port_counts[port] += 1
+        self.expire_ports(source_ip, now)
+        
+        # Alert once when the source crosses the threshold, not on every packet after
+        port_count = len(port_counts)
+        if port_count == PORT_SCAN_THRESHOLD + 1 and port_counts[port] == 1:
+            self.create_alert(
+                alert_type='port_scan',
+                severity='medium',
+                source_ip=source_ip,
+                description=f"Potential port scan detected from {source_ip}",
+                details=f"Contacted {port_count} different ports in 5 minutes"
+            )
+    
+    def expire_ports(self, source_ip, now):
+        """Drop a source's window entries older than PORT_SCAN_WINDOW"""
+        window = self._ip_ports[source_ip]
+        port_counts = self._ip_port_counts[source_ip]
+        cutoff = now - PORT_SCAN_WINDOW
+        
+        while window and window[0][0] < cutoff:
+            _, port = window.popleft()
+            port_counts[port] -= 1
+            if not port_counts[port]:
+                del port_counts[port]
+        
+        if not window:
+            del self._ip_ports[source_ip]
+            del self._ip_port_counts[source_ip]
+    
+    def create_alert(self, alert_type, severity, source_ip, description, details):
+        """Create a security alert"""
+        try:
+            cursor = self._alert_cursor
+            cursor.execute(_INSERT_ALERT_SQL,
+                           (alert_type, severity, source_ip, description, details))
+            self.db_conn.commit()
+            if cursor.rowcount:  # Ignored when an open duplicate exists
+                print(f"🚨 ALERT [{severity.upper()}]: {description}")
+            
+        except sqlite3.Error as e:
+            print(f"❌ Failed to create alert: {e}")
+
 class NetworkMonitor:
     """Main network monitoring class"""
     
-    def __init__(self):
+    def __init__(self, flush_interval=FLUSH_INTERVAL, flush_batch_size=FLUSH_BATCH_SIZE):
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
         self.running = True
         self.packet_count = 0
         self.stats = defaultdict(int)
         self.db_conn = None
+        self._pending = []
+        self._last_flush = time.time()
+        self._in_packet = False
+        self._simulated = self.simulated_fields()
+        # Counters for the current network_stats interval
+        self._minute_bucket = dict.fromkeys(('total', 'bytes', 'tcp', 'udp', 'icmp'), 0)
+        self._minute_started = time.time()
+        self.detector = None
         self.setup_database()
         
     def setup_database(self):
         """Initialize database connection"""
         try:
-            self.db_conn = sqlite3.connect(DB_PATH)
+            self.db_conn = open_db(DB_PATH)
+            ensure_schema(self.db_conn)
+            self._insert_cursor = self.db_conn.cursor()
             print("✅ Connected to database")
         except sqlite3.Error as e:
             print(f"❌ Database connection failed: {e}")
             sys.exit(1)
     
-    def simulate_traffic_event(self):
+    def simulated_fields(self):
         """
-        Simulates network traffic events for demonstration
-        In production, this would use actual packet capture with scapy
+        Endless random (source_ip, destination_ip, source_port, destination_port,
+        protocol, packet_size, flags) tuples, generated in NumPy batches
         """
-        import random
-        
         protocols = ['TCP', 'UDP', 'ICMP', 'DNS', 'HTTP', 'HTTPS']
         ips = [
             '192.168.1.100', '192.168.1.101', '192.168.1.102',
             '8.8.8.8', '1.1.1.1', '142.250.185.46'  # Google, Cloudflare, etc.
         ]
+        ports = [80, 443, 22, 53, 3306, 5432]
+        rng = np.random.default_rng()
+        size = SIMULATION_BATCH_SIZE
+        
+        while True:
+            # One vectorized draw per field, converted to Python objects once
+            yield from zip(
+                rng.choice(ips, size).tolist(),
+                rng.choice(ips, size).tolist(),
+                rng.integers(1024, 65535, size, endpoint=True).tolist(),
+                rng.choice(ports, size).tolist(),
+                rng.choice(protocols, size).tolist(),
+                rng.integers(64, 1500, size, endpoint=True).tolist(),
+                np.where(rng.random(size) > 0.5, 'SYN', 'ACK').tolist()
+            )
+    
+    def simulate_traffic_event(self):
+        """
+        Simulates network traffic events for demonstration
+        In production, this would use actual packet capture with scapy
+        """
+        (source_ip, destination_ip, source_port, destination_port,
+         protocol, packet_size, flags) = next(self._simulated)
         
         # Generate random traffic event
         event = {
-            'timestamp': datetime.now().isoformat(),
-            'source_ip': random.choice(ips),
-            'destination_ip': random.choice(ips),
-            'source_port': random.randint(1024, 65535),
-            'destination_port': random.choice([80, 443, 22, 53, 3306, 5432]),
-            'protocol': random.choice(protocols),
-            'packet_size': random.randint(64, 1500),
-            'flags': 'SYN' if random.random() > 0.5 else 'ACK',
+            'timestamp': event_timestamp(),
+            'source_ip': source_ip,
+            'destination_ip': destination_ip,
+            'source_port': source_port,
+            'destination_port': destination_port,
+            'protocol': protocol,
+            'packet_size': packet_size,
+            'flags': flags,
             'payload_preview': '[DATA]'
         }
         
         return event
     
     def log_traffic_event(self, event):
-        """Store traffic event in database"""
-        try:
-            cursor = self.db_conn.cursor()
-            cursor.execute("""
-                INSERT INTO traffic_events 
-                (timestamp, source_ip, destination_ip, source_port, destination_port, 
-                 protocol, packet_size, flags, payload_preview)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                event['timestamp'],
-                event['source_ip'],
-                event['destination_ip'],
-                event['source_port'],
-                event['destination_port'],
-                event['protocol'],
-                event['packet_size'],
-                event['flags'],
-                event['payload_preview']
-            ))
-            self.db_conn.commit()
-            self.packet_count += 1
-            self.stats[event['protocol']] += 1
-            
-        except sqlite3.Error as e:
-            print(f"❌ Failed to log event: {e}")
-    
-    def check_anomalies(self, event):
-        """
-        Basic anomaly detection
-        In production, this would use statistical analysis and ML
-        """
-        # Example: Detect potential port scan
-        cursor = self.db_conn.cursor()
-        
-        # Check if source IP has contacted many different ports recently
-        cursor.execute("""
-            SELECT COUNT(DISTINCT destination_port) as port_count
-            FROM traffic_events
-            WHERE source_ip = ?
-            AND timestamp > datetime('now', '-5 minutes')
-        """, (event['source_ip'],))
-        
-        result = cursor.fetchone()
-        if result and result[0] > 20:  # More than 20 different ports
-            self.create_alert(
-                alert_type='port_scan',
-                severity='medium',
-                source_ip=event['source_ip'],
-                description=f"Potential port scan detected from {event['source_ip']}",
-                details=f"Contacted {result[0]} different ports in 5 minutes"
-            )
+        """Queue traffic event for the next batched write"""
+        self._pending.append((
+            event['timestamp'],
+            event['source_ip'],
+            event['destination_ip'],
+            event['source_port'],
+            event['destination_port'],
+            event['protocol'],
+            event['packet_size'],
+            event['flags'],
+            event['payload_preview'],
+            ip_to_int(event['source_ip']),
+            ip_to_int(event['destination_ip'])
+        ))
+        self.packet_count += 1
+        self.stats[event['protocol']] += 1
+        
+        bucket = self._minute_bucket
+        bucket['total'] += 1
+        bucket['bytes'] += event['packet_size'] or 0
+        protocol_key = STATS_PROTOCOLS.get(event['protocol'])
+        if protocol_key:
+            bucket[protocol_key] += 1
+        
+        if len(self._pending) >= self.flush_batch_size:
+            self.flush_pending()
     
-    def create_alert(self, alert_type, severity, source_ip, description, details):
-        """Create a security alert"""
+    def flush_pending(self):
+        """Write all queued traffic events in a single transaction and hand them to the detector"""
+        self._last_flush = time.time()
+        if not self._pending:
+            return
+        
+        # Swapped out rather than cleared: the detector queue pickles it later
+        batch, self._pending = self._pending, []
+        if self.detector is not None:
+            self.detector.events.put([(row[1], row[4]) for row in batch])
+        
         try:
-            cursor = self.db_conn.cursor()
-            cursor.execute("""
-                INSERT INTO security_alerts
-                (timestamp, alert_type, severity, source_ip, description, details)
-                VALUES (datetime('now'), ?, ?, ?, ?, ?)
-            """, (alert_type, severity, source_ip, description, details))
-            self.db_conn.commit()
-            print(f"🚨 ALERT [{severity.upper()}]: {description}")
+            with self.db_conn:
+                self._insert_cursor.executemany(_INSERT_TRAFFIC_SQL, batch)
             
         except sqlite3.Error as e:
-            print(f"❌ Failed to create alert: {e}")
+            print(f"❌ Failed to log {len(batch)} event(s): {e}")
     
     def update_statistics(self):
         """Update aggregated network statistics"""
+        bucket = self._minute_bucket
+        started, ended = self._minute_started, time.time()
+        
         try:
-            cursor = self.db_conn.cursor()
-            
-            # Calculate stats for the last minute
-            cursor.execute("""
+            # Counted as events were logged, so this is a single write
+            self.db_conn.execute("""
                 INSERT INTO network_stats 
                 (interval_start, interval_end, total_packets, total_bytes,
                  tcp_packets, udp_packets, icmp_packets, avg_packet_size)
-                SELECT 
-                    datetime('now', '-1 minute') as interval_start,
-                    datetime('now') as interval_end,
-                    COUNT(*) as total_packets,
-                    SUM(packet_size) as total_bytes,
-                    SUM(CASE WHEN protocol = 'TCP' THEN 1 ELSE 0 END) as tcp_packets,
-                    SUM(CASE WHEN protocol = 'UDP' THEN 1 ELSE 0 END) as udp_packets,
-                    SUM(CASE WHEN protocol = 'ICMP' THEN 1 ELSE 0 END) as icmp_packets,
-                    AVG(packet_size) as avg_packet_size
-                FROM traffic_events
-                WHERE timestamp > datetime('now', '-1 minute')
-            """)
+                VALUES (datetime(?, 'unixepoch'), datetime(?, 'unixepoch'), ?, ?, ?, ?, ?, ?)
+            """, (
+                started,
+                ended,
+                bucket['total'],
+                bucket['bytes'],
+                bucket['tcp'],
+                bucket['udp'],
+                bucket['icmp'],
+                bucket['bytes'] / bucket['total'] if bucket['total'] else None
+            ))
             self.db_conn.commit()
             
         except sqlite3.Error as e:
             print(f"❌ Failed to update statistics: {e}")
+        
+        finally:
+            for key in bucket:
+                bucket[key] = 0
+            self._minute_started = ended
     
     def print_status(self):
         """Print current monitoring status"""
@@ -169,69 +386,224 @@ class NetworkMonitor:
         for protocol, count in sorted(self.stats.items(), key=lambda x: x[1], reverse=True):
             print(f"   {protocol}: {count}")
     
+    def stop(self, signum=None, frame=None):
+        """Signal handler: stop now, or after the packet being processed"""
+        self.running = False
+        if not self._in_packet:
+            self.cleanup()
+    
     def cleanup(self, signum=None, frame=None):
         """Cleanup resources on exit"""
         print("\n\n🛑 Stopping monitor...")
         self.running = False
         if self.db_conn:
+            self.flush_pending()
             self.db_conn.close()
+        if self.detector is not None:
+            self.detector.events.put(None)
+            self.detector.join(timeout=5)
         print("✅ Monitor stopped cleanly")
         sys.exit(0)
     
-    def run(self):
-        """Main monitoring loop"""
+    def on_packet(self, event):
+        """Process one captured packet: log it, check it and run periodic tasks"""
+        self._in_packet = True
+        try:
+            # Log the event; anomaly checks run on each flushed batch
+            self.log_traffic_event(event)
+            
+            now = time.time()
+            
+            # Write queued events at least once per interval
+            if now - self._last_flush >= self.flush_interval:
+                self.flush_pending()
+            
+            # Update statistics every minute
+            if now - self._last_stats_update > 60:
+                self.update_statistics()
+                self._last_stats_update = now
+            
+            # Print status every 10 seconds
+            if now - self._last_status_print > 10:
+                self.print_status()
+                self._last_status_print = now
+            
+        except Exception as e:
+            print(f"❌ Error in monitoring loop: {e}")
+        
+        finally:
+            self._in_packet = False
+    
+    def scapy_to_event(self, pkt):
+        """Convert a scapy packet to a traffic event, None for non-IP frames"""
+        from scapy.all import IP, TCP, UDP, ICMP
+        
+        if IP not in pkt:
+            return None
+        
+        ip = pkt[IP]
+        event = {
+            'timestamp': event_timestamp(float(pkt.time)),
+            'source_ip': ip.src,
+            'destination_ip': ip.dst,
+            'source_port': None,
+            'destination_port': None,
+            'protocol': str(ip.proto),
+            'packet_size': len(pkt),
+            'flags': '',
+            'payload_preview': ''
+        }
+        
+        if TCP in pkt:
+            event.update(protocol='TCP', source_port=pkt[TCP].sport,
+                         destination_port=pkt[TCP].dport,
+                         flags=tcp_flag_names(int(pkt[TCP].flags)))
+        elif UDP in pkt:
+            event.update(protocol='UDP', source_port=pkt[UDP].sport,
+                         destination_port=pkt[UDP].dport)
+        elif ICMP in pkt:
+            event['protocol'] = 'ICMP'
+        
+        return event
+    
+    def capture_raw(self, iface):
+        """
+        Capture IPv4 packets from an AF_PACKET socket (Linux, root)
+        Headers are decoded in place by parse_ipv4(), skipping scapy's dissectors
+        """
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_DGRAM, socket.htons(ETH_P_IP))
+        sock.bind((iface, 0))
+        buf = bytearray(65535)
+        view = memoryview(buf)
+        
+        try:
+            while self.running:
+                size = sock.recv_into(buf)
+                fields = parse_ipv4(view[:size])
+                if fields is None:
+                    continue
+                
+                (source_ip, destination_ip, protocol, source_port,
+                 destination_port, packet_size, flags) = fields
+                self.on_packet({
+                    'timestamp': event_timestamp(),
+                    'source_ip': source_ip,
+                    'destination_ip': destination_ip,
+                    'source_port': source_port,
+                    'destination_port': destination_port,
+                    'protocol': protocol,
+                    'packet_size': packet_size,
+                    'flags': flags,
+                    'payload_preview': ''
+                })
+        
+        finally:
+            sock.close()
+    
+    def run(self, iface=None, rate=10, raw=False):
+        """
+        Main monitoring loop
+        With iface, packets are captured live and handled as they arrive
+        (through scapy, or a raw socket with raw); otherwise simulated
+        events are generated at rate per second (0 = unthrottled)
+        """
         # Setup signal handlers
-        signal.signal(signal.SIGINT, self.cleanup)
-        signal.signal(signal.SIGTERM, self.cleanup)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
         
         print("=" * 60)
         print("NetSecMonitor - Network Traffic Monitor")
         print("=" * 60)
         print("🚀 Starting network monitoring...")
-        print("⚠️  NOTE: This demo uses simulated traffic data")
-        print("💡 In production, replace simulate_traffic_event() with actual packet capture")
+        if iface:
+            print(f"📡 Capturing live traffic on {iface}")
+        else:
+            print("⚠️  NOTE: This demo uses simulated traffic data")
+            print("💡 In production, pass --iface to capture real packets")
         print("Press Ctrl+C to stop\n")
         
-        last_stats_update = time.time()
-        last_status_print = time.time()
+        self._last_stats_update = time.time()
+        self._last_status_print = time.time()
+        
+        self.detector = DetectorProcess(DB_PATH)
+        self.detector.start()
         
+        if iface and raw:
+            self.capture_raw(iface)
+            self.cleanup()
+        
+        if iface:
+            # Event-driven: scapy calls back once per packet, nothing is stored
+            from scapy.all import sniff
+            
+            def handle(pkt):
+                event = self.scapy_to_event(pkt)
+                if event:
+                    self.on_packet(event)
+            
+            sniff(iface=iface, prn=handle, store=False,
+                  stop_filter=lambda pkt: not self.running)
+            self.cleanup()
+        
+        interval = 1.0 / rate if rate else 0
+        next_due = time.time()
         while self.running:
-            try:
-                # Simulate capturing a packet
-                # In production: use scapy.sniff() with packet callback
-                event = self.simulate_traffic_event()
-                
-                # Log the event
-                self.log_traffic_event(event)
-                
-                # Check for anomalies
-                if self.packet_count % 10 == 0:  # Check every 10 packets
-                    self.check_anomalies(event)
-                
-                # Update statistics every minute
-                if time.time() - last_stats_update > 60:
-                    self.update_statistics()
-                    last_stats_update = time.time()
-                
-                # Print status every 10 seconds
-                if time.time() - last_status_print > 10:
-                    self.print_status()
-                    last_status_print = time.time()
-                
-                # Simulate time between packets
-                time.sleep(0.1)  # In production, this would be event-driven
-                
-            except Exception as e:
-                print(f"❌ Error in monitoring loop: {e}")
-                continue
+            # Simulate capturing a packet
+            self.on_packet(self.simulate_traffic_event())
+            
+            # Pace the simulation to the requested rate
+            if interval:
+                next_due += interval
+                delay = next_due - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_due = time.time()
+        
+        # Stopped by a signal while a packet was being processed
+        self.cleanup()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='NetSecMonitor Network Traffic Monitor'
+    )
+    parser.add_argument(
+        '--iface',
+        help='Capture live traffic on this interface (requires scapy and root)'
+    )
+    parser.add_argument(
+        '--raw',
+        action='store_true',
+        help='With --iface, read packets from a raw AF_PACKET socket instead of scapy (Linux)'
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=10,
+        help='Simulated packets per second, 0 for unthrottled (default: 10)'
+    )
+    parser.add_argument(
+        '--flush-interval',
+        type=float,
+        default=FLUSH_INTERVAL,
+        help=f'Seconds captured events are buffered in memory before being written; '
+             f'also the most a crash can lose (default: {FLUSH_INTERVAL})'
+    )
+    parser.add_argument(
+        '--flush-batch-size',
+        type=int,
+        default=FLUSH_BATCH_SIZE,
+        help=f'Write buffered events once this many are queued (default: {FLUSH_BATCH_SIZE})'
+    )
+    
+    args = parser.parse_args()
+    
     # Check for required privileges
     import os
     if os.geteuid() != 0:
         print("⚠️  WARNING: This script typically requires sudo for packet capture")
         print("📝 For this demo, we're using simulated data so sudo is not required")
-        print("💡 In production with scapy, run with: sudo python monitor.py\n")
+        print("💡 For live capture with scapy, run with: sudo python monitor.py --iface eth0\n")
     
     # Check if database exists
     if not os.path.exists(DB_PATH):
@@ -240,5 +612,6 @@ if __name__ == "__main__":
         sys.exit(1)
     
     # Start monitoring
-    monitor = NetworkMonitor()
-    monitor.run()
+    monitor = NetworkMonitor(flush_interval=args.flush_interval,
+                             flush_batch_size=args.flush_batch_size)
+    monitor.run(iface=args.iface, rate=args.rate, raw=args.raw)
@@ -6,15 +6,62 @@ Scans for open ports and identifies services
 SAFE FOR PERSONAL USE: Only scan localhost or networks you own
 """
 
+import errno
+import itertools
+import random
+import re
+import select
+import selectors
 import socket
 import sqlite3
+import struct
+import threading
 import argparse
+from collections import deque
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 
+from db import open_db
+
 DB_PATH = "netsec_monitor.db"
 
+# Sockets a connect scan keeps open at once: connects in progress plus open
+# ports waiting for a banner. Each one holds a file descriptor, so stay well
+# under `ulimit -n`
+MAX_IN_FLIGHT = 512
+
+# Scan results are inserted SCAN_INSERT_CHUNK rows per statement:
+# 7 columns x 73 rows = 511 parameters, inside SQLite's historical 999 limit
+SCAN_INSERT_CHUNK = 73
+_INSERT_SCAN_PREFIX = """
+    INSERT INTO port_scans 
+    (scan_timestamp, target_ip, port, status, service, banner, response_time)
+    VALUES """
+_SCAN_ROW_PLACEHOLDERS = "(?, ?, ?, ?, ?, ?, ?)"
+
+def insert_scan_sql(rows):
+    """Multi-row INSERT for rows scan results; the same text is reused for equal counts"""
+    return _INSERT_SCAN_PREFIX + ", ".join([_SCAN_ROW_PLACEHOLDERS] * rows)
+
+# TCP header for a bare SYN: ports, seq, ack, data offset, flags, window,
+# checksum, urgent pointer
+TCP_SYN_HEADER = struct.Struct('!HHIIBBHHH')
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_SYN_ACK = 0x12
+
+def tcp_checksum(src_ip, dst_ip, segment):
+    """Internet checksum of a TCP segment over the IPv4 pseudo-header"""
+    data = socket.inet_aton(src_ip) + socket.inet_aton(dst_ip)
+    data += struct.pack('!BBH', 0, socket.IPPROTO_TCP, len(segment)) + segment
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    while total >> 16:
+        total = (total & 0xffff) + (total >> 16)
+    return ~total & 0xffff
+
 # Common ports and their typical services
 COMMON_PORTS = {
     21: 'FTP',
@@ -37,15 +84,35 @@ COMMON_PORTS = {
     27017: 'MongoDB'
 }
 
+# Service name indexed directly by port number
+COMMON_PORTS_TABLE = [COMMON_PORTS.get(port, 'Unknown') for port in range(65536)]
+
 class PortScanner:
     """Network port scanner with service detection"""
     
-    def __init__(self, target='127.0.0.1', timeout=1.0):
+    def __init__(self, target='127.0.0.1', timeout=1.0, threads=50):
         self.target = target
         self.timeout = timeout
-        self.db_conn = sqlite3.connect(DB_PATH)
+        self.threads = threads
+        # Banner-grab workers, reused by every scan until close()
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self.db_conn = open_db(DB_PATH)
+        self._insert_cursor = self.db_conn.cursor()
         self.scan_timestamp = datetime.now().isoformat()
         
+    def new_socket(self):
+        """
+        TCP socket whose connect gives up at the scan timeout
+        Limits SYN retransmits so unanswered probes stop costing packets (Linux only)
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if hasattr(socket, 'TCP_SYNCNT'):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_SYNCNT, 1)
+        if hasattr(socket, 'TCP_USER_TIMEOUT'):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT,
+                            max(1, int(self.timeout * 1000)))
+        return sock
+    
     def scan_port(self, port):
         """
         Scan a single port
@@ -55,7 +122,7 @@ class PortScanner:
         
         try:
             # Create socket
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock = self.new_socket()
             sock.settimeout(self.timeout)
             
             # Attempt connection
@@ -65,7 +132,7 @@ class PortScanner:
             if result == 0:
                 # Port is open, try to get banner
                 banner = self.grab_banner(sock, port)
-                service = COMMON_PORTS.get(port, 'Unknown')
+                service = COMMON_PORTS_TABLE[port]
                 sock.close()
                 return (port, 'open', service, banner, response_time)
             else:
@@ -79,6 +146,171 @@ class PortScanner:
         except Exception as e:
             return (port, 'error', None, str(e), 0)
     
+    def connect_ports(self, ports, slots):
+        """
+        Attempt connections to many ports from one thread with non-blocking sockets
+        Every socket holds one of the slots (a threading.Semaphore) while open,
+        which caps the file descriptors a scan uses
+        Yields: (port, status, sock, response_time); sock stays open only for
+        'open' ports, and the caller must close it and release its slot
+        """
+        selector = selectors.DefaultSelector()
+        ports = iter(ports)
+        in_flight = {}      # sock -> (port, start_time)
+        deadlines = deque()  # (deadline, sock); one timeout, so already in order
+        exhausted = False
+        
+        try:
+            while True:
+                # Top up the in-flight set; with nothing in flight, wait for
+                # banner threads to free slots instead of giving up
+                while not exhausted and slots.acquire(blocking=not in_flight):
+                    port = next(ports, None)
+                    if port is None:
+                        slots.release()
+                        exhausted = True
+                        break
+                    
+                    start_time = time.time()
+                    sock = None
+                    try:
+                        sock = self.new_socket()
+                        sock.setblocking(False)
+                        result = sock.connect_ex((self.target, port))
+                    except OSError as e:
+                        if sock is not None:
+                            sock.close()
+                        slots.release()
+                        if e.errno in (errno.EMFILE, errno.ENFILE) and in_flight:
+                            # Out of descriptors: retry this port once some attempts finish
+                            ports = itertools.chain([port], ports)
+                            break
+                        yield (port, 'error', None, 0)
+                        continue
+                    
+                    if result in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+                        selector.register(sock, selectors.EVENT_WRITE)
+                        in_flight[sock] = (port, start_time)
+                        deadlines.append((start_time + self.timeout, sock))
+                    elif result == 0:
+                        yield (port, 'open', sock, (time.time() - start_time) * 1000)
+                    else:
+                        sock.close()
+                        slots.release()
+                        yield (port, 'closed', None, 0)
+                
+                if not in_flight:
+                    break
+                
+                # Wait for connects to finish, at most until the oldest one times out
+                wait = max(0, deadlines[0][0] - time.time())
+                for key, _ in selector.select(wait):
+                    sock = key.fileobj
+                    selector.unregister(sock)
+                    port, start_time = in_flight.pop(sock)
+                    response_time = (time.time() - start_time) * 1000  # Convert to ms
+                    
+                    if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                        yield (port, 'open', sock, response_time)
+                    else:
+                        sock.close()
+                        slots.release()
+                        yield (port, 'closed', None, response_time)
+                
+                # Anything past its deadline without an answer is filtered
+                now = time.time()
+                while deadlines and deadlines[0][0] <= now:
+                    _, sock = deadlines.popleft()
+                    if sock in in_flight:
+                        port, _ = in_flight.pop(sock)
+                        selector.unregister(sock)
+                        sock.close()
+                        slots.release()
+                        yield (port, 'filtered', None, self.timeout * 1000)
+        
+        finally:
+            for sock in in_flight:
+                sock.close()
+                slots.release()
+            selector.close()
+    
+    def syn_scan(self, ports):
+        """
+        Half-open scan: send one raw SYN per port and classify the replies
+        SYN-ACK means open, RST means closed, silence means filtered.
+        Nothing is connected, so there are no banners. Requires root.
+        Yields: (port, status, response_time)
+        """
+        target = socket.gethostbyname(self.target)
+        
+        # Source address the kernel would route the probes from
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        probe.connect((target, 9))
+        source_ip = probe.getsockname()[0]
+        probe.close()
+        
+        # The kernel adds the IP header; the socket also receives every inbound TCP packet
+        raw = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP)
+        raw.setblocking(False)
+        source_port = random.randint(32768, 60999)
+        target_packed = socket.inet_aton(target)
+        sent_at = {}
+        
+        def drain():
+            # Replies addressed to our source port from the target
+            while True:
+                try:
+                    data = raw.recv(65535)
+                except BlockingIOError:
+                    return
+                ihl = (data[0] & 0x0f) * 4
+                if data[12:16] != target_packed or len(data) < ihl + 14:
+                    continue
+                port, dst_port = struct.unpack_from('!HH', data, ihl)
+                if dst_port != source_port or port not in sent_at:
+                    continue
+                flags = data[ihl + 13]
+                if flags & TCP_SYN_ACK == TCP_SYN_ACK:
+                    status = 'open'
+                elif flags & TCP_RST:
+                    status = 'closed'
+                else:
+                    continue  # e.g. our own probe seen on loopback
+                yield (port, status, (time.time() - sent_at.pop(port)) * 1000)
+        
+        try:
+            for port in ports:
+                header = TCP_SYN_HEADER.pack(source_port, port, random.getrandbits(32), 0,
+                                             5 << 4, TCP_SYN, 64240, 0, 0)
+                checksum = tcp_checksum(source_ip, target, header)
+                segment = header[:16] + struct.pack('!H', checksum) + header[18:]
+                sent_at[port] = time.time()
+                raw.sendto(segment, (target, 0))
+                yield from drain()
+            
+            # Collect late replies until the last probe times out
+            deadline = time.time() + self.timeout
+            while sent_at and time.time() < deadline:
+                select.select([raw], [], [], max(0, deadline - time.time()))
+                yield from drain()
+            
+            for port in sent_at:
+                yield (port, 'filtered', self.timeout * 1000)
+        
+        finally:
+            raw.close()
+    
+    def identify_open_port(self, port, sock, response_time, slots):
+        """Grab the banner of a connected port, close it and release its slot"""
+        try:
+            sock.setblocking(True)
+            banner = self.grab_banner(sock, port)
+        finally:
+            sock.close()
+            slots.release()
+        service = COMMON_PORTS_TABLE[port]
+        return (port, 'open', service, banner, response_time)
+    
     def grab_banner(self, sock, port):
         """
         Attempt to grab service banner
@@ -87,60 +319,79 @@ class PortScanner:
         try:
             # Some services send banner immediately
             sock.settimeout(0.5)
-            banner = sock.recv(1024).decode('utf-8', errors='ignore').strip()
+            # Banners are short ASCII lines; latin-1 maps bytes 1:1 without validation
+            banner = sock.recv(256).decode('latin-1').strip()
             return banner[:200]  # Limit banner length
         except:
             # Many services require a request first
             # For safety, we'll skip sending requests in this demo
             return None
     
-    def save_result(self, port, status, service, banner, response_time):
-        """Save scan result to database"""
+    def save_results(self, results):
+        """Save scan results to database in a single transaction"""
         try:
-            cursor = self.db_conn.cursor()
-            cursor.execute("""
-                INSERT INTO port_scans 
-                (scan_timestamp, target_ip, port, status, service, banner, response_time)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                self.scan_timestamp,
-                self.target,
-                port,
-                status,
-                service,
-                banner,
-                response_time
-            ))
-            self.db_conn.commit()
+            with self.db_conn:
+                for start in range(0, len(results), SCAN_INSERT_CHUNK):
+                    chunk = results[start:start + SCAN_INSERT_CHUNK]
+                    params = []
+                    for port, status, service, banner, response_time in chunk:
+                        params += (self.scan_timestamp, self.target, port, status,
+                                   service, banner, response_time)
+                    self._insert_cursor.execute(insert_scan_sql(len(chunk)), params)
         except sqlite3.Error as e:
             print(f"❌ Database error: {e}")
     
-    def scan_range(self, start_port, end_port, threads=50):
+    def scan_range(self, start_port, end_port, max_in_flight=MAX_IN_FLIGHT, syn=False):
         """
-        Scan a range of ports using multithreading
+        Scan a range of ports
+        Connects run concurrently from one event loop; only the banner
+        grabs for open ports go to the thread pool. With syn, a raw
+        half-open scan is used instead and no banners are collected.
         """
         print(f"🔍 Scanning {self.target} ports {start_port}-{end_port}")
-        print(f"⚙️  Using {threads} concurrent threads")
+        if syn:
+            print("⚙️  Half-open SYN scan (no banners)")
+        else:
+            print(f"⚙️  Up to {max_in_flight} sockets open, {self.threads} banner threads")
         print(f"⏱️  Timeout: {self.timeout}s per port\n")
         
         open_ports = []
         total_ports = end_port - start_port + 1
         scanned = 0
         
-        with ThreadPoolExecutor(max_workers=threads) as executor:
-            # Submit all port scans
-            future_to_port = {
-                executor.submit(self.scan_port, port): port 
-                for port in range(start_port, end_port + 1)
-            }
+        def results():
+            if syn:
+                for port, status, response_time in self.syn_scan(range(start_port, end_port + 1)):
+                    service = COMMON_PORTS_TABLE[port] if status == 'open' else None
+                    yield (port, status, service, None, response_time)
+                return
+            
+            # Closed and filtered ports are final as soon as the event loop reports them;
+            # open ports keep their slot until the banner thread closes them
+            slots = threading.BoundedSemaphore(max_in_flight)
+            banner_futures = []
+            for port, status, sock, response_time in self.connect_ports(
+                    range(start_port, end_port + 1), slots):
+                if status == 'open':
+                    banner_futures.append(
+                        self._executor.submit(self.identify_open_port, port, sock,
+                                              response_time, slots)
+                    )
+                else:
+                    yield (port, status, None, None, response_time)
             
-            # Process results as they complete
-            for future in as_completed(future_to_port):
-                port, status, service, banner, response_time = future.result()
+            for future in as_completed(banner_futures):
+                yield future.result()
+        
+        # Collected here and written in one transaction, even if the scan is interrupted
+        scan_results = []
+        
+        # Process results as they complete
+        try:
+            for result in results():
+                port, status, service, banner, response_time = result
                 scanned += 1
-                
-                # Save to database
-                self.save_result(port, status, service, banner, response_time)
+                scan_results.append(result)
                 
                 # Print progress
                 if scanned % 100 == 0 or status == 'open':
@@ -159,6 +410,9 @@ class PortScanner:
                     if banner:
                         print(f"   Banner: {banner[:100]}")
         
+        finally:
+            self.save_results(scan_results)
+        
         print(f"\n\n{'='*60}")
         print("Scan Complete!")
         print(f"{'='*60}")
@@ -188,26 +442,29 @@ class PortScanner:
                 print(f"   Port {port_info['port']}: {port_info['service']}")
     
     def close(self):
-        """Close database connection"""
+        """Stop the banner workers and close database connection"""
+        self._executor.shutdown()
         if self.db_conn:
             self.db_conn.close()
 
+# --ports formats, compiled once: "1-1024", or one or more comma-separated ports
+PORT_RANGE_RE = re.compile(r'\s*(\d+)\s*-\s*(\d+)\s*')
+PORT_LIST_RE = re.compile(r'\s*\d+\s*(?:,\s*\d+\s*)*')
+PORT_NUMBER_RE = re.compile(r'\d+')
+
 def parse_port_range(port_string):
     """Parse port range string (e.g., '1-1024' or '80,443,8080')"""
-    ports = []
+    # Range format: "1-1024"
+    match = PORT_RANGE_RE.fullmatch(port_string)
+    if match:
+        return int(match.group(1)), int(match.group(2))
     
-    if '-' in port_string:
-        # Range format: "1-1024"
-        start, end = port_string.split('-')
-        return int(start), int(end)
-    elif ',' in port_string:
-        # List format: "80,443,8080"
-        ports = [int(p.strip()) for p in port_string.split(',')]
+    # List format: "80,443,8080", or a single port
+    if PORT_LIST_RE.fullmatch(port_string):
+        ports = [int(p) for p in PORT_NUMBER_RE.findall(port_string)]
         return min(ports), max(ports)
-    else:
-        # Single port
-        port = int(port_string)
-        return port, port
+    
+    raise ValueError(f"invalid port range: {port_string!r}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -233,7 +490,19 @@ if __name__ == "__main__":
         '--threads',
         type=int,
         default=50,
-        help='Number of concurrent threads (default: 50)'
+        help='Number of threads grabbing banners from open ports (default: 50)'
+    )
+    parser.add_argument(
+        '--max-in-flight',
+        type=int,
+        default=MAX_IN_FLIGHT,
+        help=f'Sockets open at once, counting connects in progress and open ports '
+             f'waiting for a banner (default: {MAX_IN_FLIGHT})'
+    )
+    parser.add_argument(
+        '--syn',
+        action='store_true',
+        help='Half-open SYN scan with raw sockets, no banners (requires root)'
     )
     
     args = parser.parse_args()
@@ -259,10 +528,11 @@ if __name__ == "__main__":
         exit(1)
     
     # Perform scan
-    scanner = PortScanner(target=args.target, timeout=args.timeout)
+    scanner = PortScanner(target=args.target, timeout=args.timeout, threads=args.threads)
     
     try:
-        open_ports = scanner.scan_range(start_port, end_port, threads=args.threads)
+        open_ports = scanner.scan_range(start_port, end_port,
+                                        max_in_flight=args.max_in_flight, syn=args.syn)
         scanner.generate_report(open_ports)
     except KeyboardInterrupt:
         print("\n\n🛑 Scan interrupted by user")